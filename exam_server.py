@@ -1,10 +1,21 @@
 import sqlite3
 import os
-import json
 import uuid
-from flask import Flask, request, jsonify, send_from_directory
-from werkzeug.security import generate_password_hash, check_password_hash
+import random
+import queue
+import csv
+import codecs
+import itertools
+import hashlib
+from functools import lru_cache
+from flask import Flask, request, jsonify, send_from_directory, g
+from flask.json.provider import JSONProvider
+import orjson
+from werkzeug.security import check_password_hash
+import bcrypt
 from datetime import datetime, timedelta
+from typing import Annotated, Optional
+import msgspec
 
 # Determine the directory of the script to make file paths reliable
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,60 +29,350 @@ if not os.path.exists(DATA_DIR):
 DATABASE_PATH = os.path.join(DATA_DIR, 'exam_data.db')
 STATIC_DIR = os.path.join(SCRIPT_DIR, 'static')
 
+# Size of the per-process connection pool
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', (os.cpu_count() or 1) * 2))
+
+# Rows handed to executemany at a time when importing CSV uploads
+UPLOAD_BATCH_SIZE = 1000
+
+# bcrypt cost factor for teacher passwords; raise it as hardware gets faster
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+# bcrypt only looks at the first 72 bytes of a password
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
+# Statements run on every exam start / autosave / submission, kept together so
+# the handlers that share them use the same text
+SQL_GET_EXAM_SETTINGS = '''
+    SELECT teacher_id, exam_title, school_name, duration, allowed_attempts, passing_percentage, enable_analysis_report
+    FROM exams WHERE exam_id = ?
+'''
+SQL_GET_STUDENT = 'SELECT student_name, teacher_id FROM students WHERE student_id = ?'
+SQL_COUNT_ATTEMPTS = 'SELECT COUNT(*) as num_attempts FROM results WHERE student_id = ? AND exam_id = ?'
+SQL_GET_EXAM_QUESTIONS = 'SELECT question_text, options, image_url FROM questions WHERE exam_id = ?'
+SQL_GET_IN_PROGRESS = 'SELECT answers, time_left, question_status FROM in_progress_exams WHERE student_id = ? AND exam_id = ?'
+# Autosaves update the row in place, and an autosave identical to the stored state
+# matches no row in the WHERE clause, so it writes nothing
+SQL_SAVE_PROGRESS = '''
+    INSERT INTO in_progress_exams (student_id, exam_id, teacher_id, answers, time_left, question_status)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (student_id, exam_id) DO UPDATE SET
+        teacher_id = excluded.teacher_id, answers = excluded.answers,
+        time_left = excluded.time_left, question_status = excluded.question_status
+    WHERE in_progress_exams.answers IS NOT excluded.answers
+       OR in_progress_exams.time_left IS NOT excluded.time_left
+       OR in_progress_exams.question_status IS NOT excluded.question_status
+       OR in_progress_exams.teacher_id IS NOT excluded.teacher_id
+'''
+SQL_GET_QUESTIONS_VERSION = 'SELECT questions_version FROM exams WHERE exam_id = ?'
+SQL_GET_STUDENTS_VERSION = 'SELECT students_version FROM teachers WHERE teacher_id = ?'
+SQL_GET_ANSWER_KEY = 'SELECT question_text, correct_option, options FROM questions WHERE exam_id = ?'
+
 app = Flask(__name__, static_url_path='/static', static_folder=STATIC_DIR)
 
-def get_db_connection():
-    """Establishes a connection to the database."""
-    conn = sqlite3.connect(DATABASE_PATH)
+class OrjsonProvider(JSONProvider):
+    """Serves request parsing and jsonify() through orjson instead of the stdlib json module."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of round-tripping through str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS), mimetype='application/json')
+
+app.json = OrjsonProvider(app)
+
+def open_db_connection():
+    """Opens and tunes a new connection to the database."""
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False, timeout=5.0, cached_statements=256)
     conn.row_factory = sqlite3.Row
+    # Per-connection tuning. journal_mode=WAL is persistent and set once in init_db;
+    # synchronous=NORMAL is durable under WAL and saves an fsync per commit.
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA mmap_size = 268435456')
+    conn.execute('PRAGMA cache_size = -64000')
+    conn.execute('PRAGMA busy_timeout = 5000')
+    conn.execute('PRAGMA foreign_keys = ON')
+    return conn
+
+# Bounded pool of connections shared by all request threads. Slots start empty
+# and are opened on first checkout, so nothing is opened before a worker forks.
+_POOL = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+for _ in range(DB_POOL_SIZE):
+    _POOL.put(None)
+
+def _checkout_connection():
+    conn = _POOL.get()
+    if conn is None:
+        try:
+            conn = open_db_connection()
+        except Exception:
+            _POOL.put(None)
+            raise
     return conn
 
+def _release_connection(conn):
+    # Never hand an open transaction to the next borrower
+    if conn.in_transaction:
+        conn.rollback()
+    _POOL.put(conn)
+
+def _table_columns(c, table):
+    return [row['name'] for row in c.execute(f'PRAGMA table_info({table})')]
+
+def _add_column_if_missing(c, table, column, definition):
+    if column not in _table_columns(c, table):
+        c.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def _create_table(c, table, columns):
+    """Creates a table, or rebuilds one created before its foreign keys cascaded."""
+    existing = c.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    if existing is None:
+        c.execute(f'CREATE TABLE {table} ({columns})')
+    elif 'ON DELETE CASCADE' in columns and 'ON DELETE CASCADE' not in existing['sql']:
+        # SQLite cannot alter a constraint, so copy the rows into a new table.
+        # Foreign keys must be off here or dropping the old table would cascade.
+        old_columns = ', '.join(_table_columns(c, table))
+        c.execute(f'CREATE TABLE {table}_rebuild ({columns})')
+        c.execute(f'INSERT INTO {table}_rebuild ({old_columns}) SELECT {old_columns} FROM {table}')
+        c.execute(f'DROP TABLE {table}')
+        c.execute(f'ALTER TABLE {table}_rebuild RENAME TO {table}')
+
+# Version counters, bumped in the same transaction as every write to a teacher's
+# students or an exam's questions. They double as the ETags of the matching GETs.
+def _bump_students_version(c, teacher_id):
+    c.execute('UPDATE teachers SET students_version = students_version + 1 WHERE teacher_id = ?', (teacher_id,))
+
+def _bump_questions_version(c, exam_id):
+    c.execute('UPDATE exams SET questions_version = questions_version + 1 WHERE exam_id = ?', (exam_id,))
+
+# Keyed on the exam's questions_version: any question write bumps it, so stale
+# entries are never looked up again and simply age out of the cache.
+@lru_cache(maxsize=1024)
+def _exam_answer_key(exam_id, questions_version):
+    """Returns the exam's (question_text, correct_option, options) rows."""
+    rows = get_db_connection().execute(SQL_GET_ANSWER_KEY, (exam_id,)).fetchall()
+    return tuple((row['question_text'], row['correct_option'], row['options']) for row in rows)
+
+def _not_modified(etag):
+    """Returns a bare 304 response if the client's If-None-Match already holds etag."""
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+def _version_etag(c, sql, key):
+    """Reads a version counter as an ETag; returns (etag, 304 response or None)."""
+    # Call this before reading the rows so a concurrent write can only make the ETag stale, never ahead
+    version = c.execute(sql, (key,)).fetchone()
+    etag = str(version[0] if version else 0)
+    return etag, _not_modified(etag)
+
+def _with_etag(response, etag):
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate it on every use
+    response.cache_control.no_cache = True
+    return response
+
+# The HTML pages only change on deploy, so each is read once per process
+@lru_cache(maxsize=None)
+def _load_page(filename):
+    """Returns the page's bytes and an ETag derived from them."""
+    with open(os.path.join(STATIC_DIR, filename), 'rb') as f:
+        body = f.read()
+    return body, hashlib.sha1(body).hexdigest()
+
+def _serve_page(filename):
+    body, etag = _load_page(filename)
+    response = _not_modified(etag) or app.response_class(body, mimetype='text/html')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 60
+    return response
+
+def hash_password(password):
+    """Hashes a password with bcrypt at the configured cost."""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('ascii')
+
+def verify_password(password_hash, password):
+    """Checks a password against a bcrypt hash or a legacy werkzeug pbkdf2 hash."""
+    if not password_hash.startswith('$2'):
+        return check_password_hash(password_hash, password)
+    password_bytes = password.encode('utf-8')
+    if len(password_bytes) > BCRYPT_MAX_PASSWORD_BYTES:
+        return False
+    return bcrypt.checkpw(password_bytes, password_hash.encode('ascii'))
+
+def password_needs_rehash(password_hash, password):
+    """True for legacy hashes and bcrypt hashes made with a different cost."""
+    # A legacy hash may guard a password too long for bcrypt; keep it as it is
+    if len(password.encode('utf-8')) > BCRYPT_MAX_PASSWORD_BYTES:
+        return False
+    return not password_hash.startswith('$2') or int(password_hash.split('$')[2]) != BCRYPT_ROUNDS
+
+def _read_csv_upload(file_storage):
+    """Yields the stripped cells of each data row of an uploaded CSV, skipping the header."""
+    # Like the portal's old FileReader.readAsText, swap undecodable bytes (e.g. a
+    # cp1252 export from Excel) for U+FFFD instead of rejecting the file
+    reader = csv.reader(codecs.iterdecode(file_storage.stream, 'utf-8-sig', errors='replace'))
+    next(reader, None)
+    for row in reader:
+        yield [cell.strip() for cell in row]
+
+def _refresh_statistics(c, table):
+    """Re-runs ANALYZE after a bulk load; the load is already committed, so a failure only keeps the old statistics."""
+    try:
+        c.execute(f'ANALYZE {table}')
+    except sqlite3.Error:
+        pass
+
+def _executemany_in_batches(c, sql, rows):
+    """Feeds an iterable of bind tuples to executemany in bounded batches; returns the row count."""
+    total = 0
+    while True:
+        batch = list(itertools.islice(rows, UPLOAD_BATCH_SIZE))
+        if not batch:
+            return total
+        c.executemany(sql, batch)
+        total += len(batch)
+
+def _page_limit():
+    """Parses the optional ?limit= page size: -1 (no limit) when absent, None when not an integer >= 1."""
+    raw = request.args.get('limit')
+    if raw is None:
+        return -1
+    try:
+        limit = int(raw)
+    except ValueError:
+        return None
+    return limit if limit >= 1 else None
+
+def _stream_json_rows(cursor):
+    """Streams a query's rows as a JSON array, encoding one row at a time."""
+    # The app context is torn down before the body is sent, so take the cursor's
+    # connection off g and return it to the pool once the body is exhausted, or
+    # when the response is closed without being read to the end
+    conn = g.pop('db_conn')
+    released = False
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            cursor.close()
+            _release_connection(conn)
+    def generate():
+        try:
+            yield b'['
+            for i, row in enumerate(cursor):
+                yield (b',' if i else b'') + orjson.dumps(dict(row))
+            yield b']'
+        finally:
+            release()
+    response = app.response_class(generate(), mimetype='application/json')
+    response.call_on_close(release)
+    return response
+
+def get_db_connection():
+    """Returns the pooled connection checked out for the current request."""
+    if 'db_conn' not in g:
+        g.db_conn = _checkout_connection()
+    return g.db_conn
+
+@app.teardown_appcontext
+def release_db_connection(exception):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        _release_connection(conn)
+
 def init_db():
     """Initializes the database with all necessary tables."""
-    conn = get_db_connection()
+    # A private connection, closed below, so the pool stays empty until a
+    # worker serves its first request
+    conn = open_db_connection()
     c = conn.cursor()
 
+    # Write-ahead logging lets readers proceed while a writer commits
+    c.execute('PRAGMA journal_mode = WAL')
+    # Off while tables are migrated below
+    c.execute('PRAGMA foreign_keys = OFF')
+    # Every worker runs this at startup. Take the write lock before inspecting
+    # the schema so one worker migrates, the rest see its committed result, and
+    # a crash part way through leaves the old schema intact.
+    c.execute('BEGIN IMMEDIATE')
+
     # Create teachers table
     c.execute('''
         CREATE TABLE IF NOT EXISTS teachers (
             teacher_id TEXT PRIMARY KEY,
-            password_hash TEXT NOT NULL
+            password_hash TEXT NOT NULL,
+            students_version INTEGER NOT NULL DEFAULT 0
         )
     ''')
+    _add_column_if_missing(c, 'teachers', 'students_version', 'INTEGER NOT NULL DEFAULT 0')
 
     # Create students table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS students (
+    _create_table(c, 'students', '''
             student_id TEXT PRIMARY KEY,
             teacher_id TEXT NOT NULL,
             student_name TEXT NOT NULL,
-            FOREIGN KEY (teacher_id) REFERENCES teachers(teacher_id)
-        )
+            FOREIGN KEY (teacher_id) REFERENCES teachers(teacher_id) ON DELETE CASCADE
     ''')
-    
-    # Create questions table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS questions (
-            exam_id TEXT NOT NULL,
+
+    # Create exams table
+    _create_table(c, 'exams', '''
+            exam_id TEXT PRIMARY KEY,
             teacher_id TEXT NOT NULL,
-            question_text TEXT NOT NULL,
-            correct_option TEXT NOT NULL,
-            options TEXT NOT NULL,
             exam_title TEXT NOT NULL,
             school_name TEXT,
             duration INTEGER,
             allowed_attempts INTEGER,
             passing_percentage REAL,
-            image_url TEXT,
             enable_analysis_report INTEGER,
+            questions_version INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (teacher_id) REFERENCES teachers(teacher_id) ON DELETE CASCADE
+    ''')
+    _add_column_if_missing(c, 'exams', 'questions_version', 'INTEGER NOT NULL DEFAULT 0')
+
+    # Older databases stored the exam settings on every question row, plus a
+    # "placeholder" question per exam. Move them aside to migrate below.
+    migrate_questions = 'exam_title' in _table_columns(c, 'questions')
+    if migrate_questions:
+        c.execute('ALTER TABLE questions RENAME TO questions_legacy')
+
+    # Create questions table
+    _create_table(c, 'questions', '''
+            exam_id TEXT NOT NULL,
+            teacher_id TEXT NOT NULL,
+            question_text TEXT NOT NULL,
+            correct_option TEXT NOT NULL,
+            options TEXT NOT NULL,
+            image_url TEXT,
             PRIMARY KEY (exam_id, question_text),
-            FOREIGN KEY (teacher_id) REFERENCES teachers(teacher_id)
-        )
+            FOREIGN KEY (exam_id) REFERENCES exams(exam_id) ON DELETE CASCADE,
+            FOREIGN KEY (teacher_id) REFERENCES teachers(teacher_id) ON DELETE CASCADE
     ''')
 
+    if migrate_questions:
+        # Prefer the placeholder row's settings, falling back to any question of the exam
+        c.execute('''
+            INSERT OR IGNORE INTO exams (exam_id, teacher_id, exam_title, school_name, duration, allowed_attempts, passing_percentage, enable_analysis_report)
+            SELECT exam_id, teacher_id, exam_title, school_name, duration, allowed_attempts, passing_percentage, enable_analysis_report
+            FROM questions_legacy ORDER BY question_text != 'placeholder'
+        ''')
+        c.execute('''
+            INSERT INTO questions (exam_id, teacher_id, question_text, correct_option, options, image_url)
+            SELECT exam_id, teacher_id, question_text, correct_option, options, image_url
+            FROM questions_legacy WHERE question_text != 'placeholder'
+        ''')
+        c.execute('DROP TABLE questions_legacy')
+
     # Create results table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS results (
+    _create_table(c, 'results', '''
             result_id TEXT PRIMARY KEY,
             exam_id TEXT NOT NULL,
             student_id TEXT NOT NULL,
@@ -79,23 +380,29 @@ def init_db():
             student_name TEXT NOT NULL,
             score INTEGER NOT NULL,
             answers TEXT NOT NULL,
-            submission_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
+            submission_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (exam_id) REFERENCES exams(exam_id) ON DELETE CASCADE
     ''')
 
     # Create in-progress exams table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS in_progress_exams (
+    _create_table(c, 'in_progress_exams', '''
             student_id TEXT NOT NULL,
             exam_id TEXT NOT NULL,
             teacher_id TEXT NOT NULL,
             answers TEXT NOT NULL,
             question_status TEXT NOT NULL,
             time_left INTEGER NOT NULL,
-            PRIMARY KEY (student_id, exam_id)
-        )
+            PRIMARY KEY (student_id, exam_id),
+            FOREIGN KEY (exam_id) REFERENCES exams(exam_id) ON DELETE CASCADE
     ''')
 
+    # Secondary indexes for the hot lookups. (exam_id, question_text) is
+    # already covered by the questions primary key.
+    c.execute('CREATE INDEX IF NOT EXISTS idx_exams_teacher ON exams (teacher_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_questions_teacher ON questions (teacher_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_results_student_exam ON results (student_id, exam_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_students_teacher ON students (teacher_id)')
+
     conn.commit()
     conn.close()
 
@@ -113,450 +420,499 @@ def serve_worker():
 @app.route('/')
 def serve_admin_portal():
     """Serves the main Admin/Teacher portal page."""
-    return send_from_directory(STATIC_DIR, 'admin_teacher_portal.html')
+    return _serve_page('admin_teacher_portal.html')
 
 @app.route('/exam')
 def serve_student_client():
     """Serves the student exam client page (Short Link)."""
-    return send_from_directory(STATIC_DIR, 'student_exam_client.html')
+    return _serve_page('student_exam_client.html')
+
+# --- REQUEST BODIES ---
+# JSON bodies are decoded and validated in one pass with msgspec; a body that does
+# not match its struct is answered with a 400 by handle_invalid_body.
+
+NonEmptyStr = Annotated[str, msgspec.Meta(min_length=1)]
+PositiveInt = Annotated[int, msgspec.Meta(gt=0)]
+
+class TeacherCredentials(msgspec.Struct):
+    teacher_id: NonEmptyStr
+    password: NonEmptyStr
+
+class CreateStudentRequest(msgspec.Struct):
+    teacher_id: NonEmptyStr
+    student_id: NonEmptyStr
+    student_name: NonEmptyStr
+
+class DeleteStudentRequest(msgspec.Struct):
+    teacher_id: NonEmptyStr
+    student_id: NonEmptyStr
+
+class UpdateStudentRequest(msgspec.Struct):
+    teacher_id: NonEmptyStr
+    old_student_id: NonEmptyStr
+    new_student_id: NonEmptyStr
+    student_name: NonEmptyStr
+
+class UploadQuestionRequest(msgspec.Struct):
+    teacher_id: NonEmptyStr
+    exam_id: NonEmptyStr
+    question_text: NonEmptyStr
+    correct_option: NonEmptyStr
+    options: Annotated[dict[str, str], msgspec.Meta(min_length=1)]
+    original_question_text: Optional[str] = None
+    image_url: Optional[str] = None
+
+class ExamSettingsRequest(msgspec.Struct):
+    teacher_id: NonEmptyStr
+    exam_id: NonEmptyStr
+    exam_title: NonEmptyStr
+    school_name: NonEmptyStr
+    duration: PositiveInt
+    attempts: PositiveInt
+    passing_percentage: float
+    enable_analysis_report: bool = False
+
+class StartExamRequest(msgspec.Struct):
+    student_id: NonEmptyStr
+    exam_id: NonEmptyStr
+
+class SaveProgressRequest(msgspec.Struct):
+    student_id: NonEmptyStr
+    exam_id: NonEmptyStr
+    teacher_id: NonEmptyStr
+    answers: Annotated[dict[str, Optional[str]], msgspec.Meta(min_length=1)]
+    time_left: int
+    question_status: Annotated[dict[str, str], msgspec.Meta(min_length=1)]
+
+class SubmitExamRequest(msgspec.Struct):
+    exam_id: NonEmptyStr
+    student_id: NonEmptyStr
+    student_name: NonEmptyStr
+    teacher_id: NonEmptyStr
+    answers: dict[str, Optional[str]] = {}
+
+class DeleteQuestionRequest(msgspec.Struct):
+    teacher_id: NonEmptyStr
+    exam_id: NonEmptyStr
+    question_text: NonEmptyStr
+
+def decode_body(struct_type):
+    """Decodes the JSON request body straight into struct_type."""
+    return msgspec.json.decode(request.get_data(), type=struct_type)
+
+@app.errorhandler(msgspec.DecodeError)
+def handle_invalid_body(e):
+    # Covers both malformed JSON and msgspec.ValidationError
+    return jsonify({'message': f'Invalid data: {e}'}), 400
 
 # --- API ENDPOINTS ---
 
 @app.route('/api/register/teacher', methods=['POST'])
 def register_teacher():
-    data = request.json
-    teacher_id = data.get('teacher_id')
-    password = data.get('password')
+    req = decode_body(TeacherCredentials)
+    teacher_id = req.teacher_id
+    password = req.password
 
-    if not teacher_id or not password:
-        return jsonify({'message': 'Teacher ID and password are required'}), 400
+    if len(password.encode('utf-8')) > BCRYPT_MAX_PASSWORD_BYTES:
+        return jsonify({'message': f'Password must be at most {BCRYPT_MAX_PASSWORD_BYTES} bytes long'}), 400
+
+    password_hash = hash_password(password)
 
     conn = get_db_connection()
-    try:
-        c = conn.cursor()
-        c.execute('SELECT 1 FROM teachers WHERE teacher_id = ?', (teacher_id,))
-        if c.fetchone():
-            return jsonify({'message': 'Teacher ID already exists'}), 409
-        
-        password_hash = generate_password_hash(password)
-        c.execute('INSERT INTO teachers (teacher_id, password_hash) VALUES (?, ?)', (teacher_id, password_hash))
-        conn.commit()
-        return jsonify({'message': 'Teacher registered successfully'}), 201
-    except sqlite3.IntegrityError:
+    c = conn.cursor()
+    # One statement both checks and claims the ID; no row back means it was taken
+    c.execute('INSERT INTO teachers (teacher_id, password_hash) VALUES (?, ?) ON CONFLICT (teacher_id) DO NOTHING RETURNING teacher_id', (teacher_id, password_hash))
+    if c.fetchone() is None:
         return jsonify({'message': 'Teacher ID already exists'}), 409
-    finally:
-        conn.close()
+    conn.commit()
+    return jsonify({'message': 'Teacher registered successfully'}), 201
 
 @app.route('/api/login/teacher', methods=['POST'])
 def login_teacher():
-    data = request.json
-    teacher_id = data.get('teacher_id')
-    password = data.get('password')
-
-    if not teacher_id or not password:
-        return jsonify({'message': 'Teacher ID and password are required'}), 400
+    req = decode_body(TeacherCredentials)
+    teacher_id = req.teacher_id
+    password = req.password
 
     conn = get_db_connection()
-    try:
-        c = conn.cursor()
-        c.execute('SELECT password_hash FROM teachers WHERE teacher_id = ?', (teacher_id,))
-        teacher = c.fetchone()
-        
-        if teacher and check_password_hash(teacher['password_hash'], password):
-            return jsonify({'message': 'Login successful'}), 200
-        else:
-            return jsonify({'message': 'Invalid Teacher ID or password'}), 401
-    finally:
-        conn.close()
+    c = conn.cursor()
+    c.execute('SELECT password_hash FROM teachers WHERE teacher_id = ?', (teacher_id,))
+    teacher = c.fetchone()
+    
+    if teacher and verify_password(teacher['password_hash'], password):
+        if password_needs_rehash(teacher['password_hash'], password):
+            c.execute('UPDATE teachers SET password_hash = ? WHERE teacher_id = ?', (hash_password(password), teacher_id))
+            conn.commit()
+        return jsonify({'message': 'Login successful'}), 200
+    else:
+        return jsonify({'message': 'Invalid Teacher ID or password'}), 401
     
 @app.route('/api/students/bulk-upload-csv', methods=['POST'])
 def bulk_upload_students():
-    data = request.json
-    teacher_id = data.get('teacher_id')
-    students_list = data.get('students')
+    teacher_id = request.form.get('teacher_id')
+    csv_file = request.files.get('file')
     
-    if not teacher_id or not students_list:
+    if not teacher_id or not csv_file:
         return jsonify({'message': 'Invalid data'}), 400
 
     conn = get_db_connection()
     c = conn.cursor()
     
     try:
-        for student in students_list:
-            c.execute('INSERT OR IGNORE INTO students (student_id, teacher_id, student_name) VALUES (?, ?, ?)',
-                      (student['student_id'], teacher_id, student['student_name']))
+        # CSV columns: student_id, student_name
+        rows = ((row[0], teacher_id, row[1]) for row in _read_csv_upload(csv_file)
+                if len(row) >= 2 and row[0] and row[1])
+        count = _executemany_in_batches(c, 'INSERT OR IGNORE INTO students (student_id, teacher_id, student_name) VALUES (?, ?, ?)', rows)
+        if count == 0:
+            return jsonify({'message': 'CSV file is empty or has only a header.'}), 400
+        _bump_students_version(c, teacher_id)
         conn.commit()
-        return jsonify({'message': f'Successfully uploaded {len(students_list)} students.'}), 200
+        _refresh_statistics(c, 'students')
+        return jsonify({'message': f'Successfully uploaded {count} students.'}), 200
+    except sqlite3.IntegrityError:
+        # The only constraint left to fail is the teachers foreign key
+        return jsonify({'message': 'Teacher not found.'}), 404
     except Exception as e:
         return jsonify({'message': f'An error occurred: {str(e)}'}), 500
-    finally:
-        conn.close()
 
 @app.route('/api/student/create', methods=['POST'])
 def create_single_student():
-    data = request.json
-    teacher_id = data.get('teacher_id')
-    student_id = data.get('student_id')
-    student_name = data.get('student_name')
-    
-    if not teacher_id or not student_id or not student_name:
-        return jsonify({'message': 'Invalid data. Teacher ID, Student ID, and Student Name are required.'}), 400
+    req = decode_body(CreateStudentRequest)
+    teacher_id = req.teacher_id
+    student_id = req.student_id
+    student_name = req.student_name
 
     conn = get_db_connection()
     c = conn.cursor()
 
     try:
-        c.execute('INSERT OR IGNORE INTO students (student_id, teacher_id, student_name) VALUES (?, ?, ?)', (student_id, teacher_id, student_name))
-        conn.commit()
-        if c.rowcount == 0:
+        c.execute('INSERT INTO students (student_id, teacher_id, student_name) VALUES (?, ?, ?) ON CONFLICT (student_id) DO NOTHING RETURNING student_id', (student_id, teacher_id, student_name))
+        if c.fetchone() is None:
             return jsonify({'message': 'Student ID already exists.'}), 409
+        _bump_students_version(c, teacher_id)
+        conn.commit()
         return jsonify({'message': 'Student created successfully.'}), 201
+    except sqlite3.IntegrityError:
+        # The only constraint left to fail is the teachers foreign key
+        return jsonify({'message': 'Teacher not found.'}), 404
     except Exception as e:
         return jsonify({'message': f'An error occurred: {str(e)}'}), 500
-    finally:
-        conn.close()
 
 @app.route('/api/student/delete', methods=['DELETE'])
 def delete_student():
-    data = request.json
-    teacher_id = data.get('teacher_id')
-    student_id = data.get('student_id')
+    req = decode_body(DeleteStudentRequest)
+    teacher_id = req.teacher_id
+    student_id = req.student_id
 
     conn = get_db_connection()
     c = conn.cursor()
     try:
         c.execute('DELETE FROM students WHERE student_id = ? AND teacher_id = ?', (student_id, teacher_id))
-        conn.commit()
         if c.rowcount == 0:
             return jsonify({'message': 'Student not found or not authorized to delete.'}), 404
+        _bump_students_version(c, teacher_id)
+        conn.commit()
         return jsonify({'message': 'Student deleted successfully.'}), 200
     except Exception as e:
         return jsonify({'message': f'An error occurred: {str(e)}'}), 500
-    finally:
-        conn.close()
 
 @app.route('/api/student/update', methods=['PUT'])
 def update_student():
-    data = request.json
-    teacher_id = data.get('teacher_id')
-    old_student_id = data.get('old_student_id')
-    new_student_id = data.get('new_student_id')
-    student_name = data.get('student_name')
-
-    if not all([teacher_id, old_student_id, new_student_id, student_name]):
-        return jsonify({'message': 'Invalid data'}), 400
+    req = decode_body(UpdateStudentRequest)
+    teacher_id = req.teacher_id
+    old_student_id = req.old_student_id
+    new_student_id = req.new_student_id
+    student_name = req.student_name
 
     conn = get_db_connection()
     c = conn.cursor()
     try:
         c.execute('UPDATE students SET student_id = ?, student_name = ? WHERE student_id = ? AND teacher_id = ?',
                   (new_student_id, student_name, old_student_id, teacher_id))
-        conn.commit()
         if c.rowcount == 0:
             return jsonify({'message': 'Student not found or not authorized to update.'}), 404
+        _bump_students_version(c, teacher_id)
+        conn.commit()
         return jsonify({'message': 'Student updated successfully.'}), 200
     except Exception as e:
         return jsonify({'message': f'An error occurred: {str(e)}'}), 500
-    finally:
-        conn.close()
 
 @app.route('/api/students/<teacher_id>', methods=['GET'])
 def get_students_by_teacher(teacher_id):
     conn = get_db_connection()
     c = conn.cursor()
+    etag, not_modified = _version_etag(c, SQL_GET_STUDENTS_VERSION, teacher_id)
+    if not_modified:
+        return not_modified
+
     c.execute('SELECT student_id, student_name FROM students WHERE teacher_id = ?', (teacher_id,))
     students = c.fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in students]), 200
+    return _with_etag(jsonify([dict(row) for row in students]), etag), 200
 
 @app.route('/api/questions/bulk-upload-csv', methods=['POST'])
 def bulk_upload_questions():
-    data = request.json
-    teacher_id = data.get('teacher_id')
-    exam_id = data.get('exam_id')
-    questions = data.get('questions')
+    teacher_id = request.form.get('teacher_id')
+    exam_id = request.form.get('exam_id')
+    csv_file = request.files.get('file')
     
-    if not teacher_id or not exam_id or not questions:
+    if not teacher_id or not exam_id or not csv_file:
         return jsonify({'message': 'Invalid data provided.'}), 400
 
     conn = get_db_connection()
     c = conn.cursor()
 
     try:
-        c.execute('SELECT exam_title, school_name, duration, allowed_attempts, passing_percentage, enable_analysis_report FROM questions WHERE exam_id = ? AND teacher_id = ? AND question_text = "placeholder" LIMIT 1', (exam_id, teacher_id))
-        exam_settings = c.fetchone()
-        if not exam_settings:
+        c.execute('SELECT 1 FROM exams WHERE exam_id = ? AND teacher_id = ?', (exam_id, teacher_id))
+        if not c.fetchone():
             return jsonify({'message': 'Exam settings not found. Please save exam settings first.'}), 404
-        
-        exam_title = exam_settings['exam_title']
-        school_name = exam_settings['school_name']
-        duration = exam_settings['duration']
-        attempts = exam_settings['allowed_attempts']
-        passing_percentage = exam_settings['passing_percentage']
-        enable_analysis_report = exam_settings['enable_analysis_report']
-
-        for q in questions:
-            q_options_json = json.dumps(q['options'])
-            c.execute('''
-                INSERT OR REPLACE INTO questions (exam_id, teacher_id, question_text, correct_option, options, exam_title, school_name, duration, allowed_attempts, passing_percentage, image_url, enable_analysis_report)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (exam_id, teacher_id, q['question_text'], q['correct_option'], q_options_json, exam_title, school_name, duration, attempts, passing_percentage, q.get('image_url'), enable_analysis_report))
 
+        # CSV columns: question_text, correct_option, option A, B, C, D, image_url
+        def question_rows():
+            for row in _read_csv_upload(csv_file):
+                row += [''] * (7 - len(row))
+                if not row[0] or not row[1]:
+                    continue
+                options = {key: value for key, value in zip('ABCD', row[2:6]) if value}
+                yield (exam_id, teacher_id, row[0], row[1].upper(), orjson.dumps(options).decode(), row[6] or None)
+
+        count = _executemany_in_batches(c, '''
+            INSERT INTO questions (exam_id, teacher_id, question_text, correct_option, options, image_url)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (exam_id, question_text) DO UPDATE SET
+                correct_option = excluded.correct_option, options = excluded.options, image_url = excluded.image_url
+        ''', question_rows())
+        if count == 0:
+            return jsonify({'message': 'CSV file is empty or has only a header.'}), 400
+
+        _bump_questions_version(c, exam_id)
         conn.commit()
-        return jsonify({'message': f'Successfully uploaded {len(questions)} questions.'}), 200
+        _refresh_statistics(c, 'questions')
+        return jsonify({'message': f'Successfully uploaded {count} questions.'}), 200
     except Exception as e:
         return jsonify({'message': f'An error occurred: {str(e)}'}), 500
-    finally:
-        conn.close()
 
 @app.route('/api/questions/single-upload', methods=['POST'])
 def single_upload_question():
-    data = request.json
-    teacher_id = data.get('teacher_id')
-    exam_id = data.get('exam_id')
-    question_text = data.get('question_text')
-    original_question_text = data.get('original_question_text')
-    correct_option = data.get('correct_option')
-    options = data.get('options')
-    image_url = data.get('image_url')
-    
-    if not all([teacher_id, exam_id, question_text, correct_option, options]):
-        return jsonify({'message': 'All required fields are missing.'}), 400
-        
+    req = decode_body(UploadQuestionRequest)
+    teacher_id = req.teacher_id
+    exam_id = req.exam_id
+    question_text = req.question_text
+    original_question_text = req.original_question_text
+    correct_option = req.correct_option
+    options = req.options
+    image_url = req.image_url
+
     conn = get_db_connection()
     c = conn.cursor()
     
     try:
-        c.execute('SELECT exam_title, school_name, duration, allowed_attempts, passing_percentage, enable_analysis_report FROM questions WHERE exam_id = ? AND teacher_id = ? AND question_text = "placeholder" LIMIT 1', (exam_id, teacher_id))
-        exam_settings = c.fetchone()
-        if not exam_settings:
+        c.execute('SELECT 1 FROM exams WHERE exam_id = ? AND teacher_id = ?', (exam_id, teacher_id))
+        if not c.fetchone():
             return jsonify({'message': 'Exam settings not found. Please save exam settings first.'}), 404
 
         if original_question_text and original_question_text != question_text:
             c.execute('DELETE FROM questions WHERE teacher_id = ? AND exam_id = ? AND question_text = ?', (teacher_id, exam_id, original_question_text))
             
         c.execute('''
-            INSERT OR REPLACE INTO questions (exam_id, teacher_id, question_text, correct_option, options, exam_title, school_name, duration, allowed_attempts, passing_percentage, image_url, enable_analysis_report)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (exam_id, teacher_id, question_text, correct_option, json.dumps(options), exam_settings['exam_title'], exam_settings['school_name'], exam_settings['duration'], exam_settings['allowed_attempts'], exam_settings['passing_percentage'], image_url, exam_settings['enable_analysis_report']))
+            INSERT INTO questions (exam_id, teacher_id, question_text, correct_option, options, image_url)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (exam_id, question_text) DO UPDATE SET
+                correct_option = excluded.correct_option, options = excluded.options, image_url = excluded.image_url
+        ''', (exam_id, teacher_id, question_text, correct_option, orjson.dumps(options).decode(), image_url))
+        _bump_questions_version(c, exam_id)
         conn.commit()
         return jsonify({'message': 'Question saved/updated successfully.'}), 200
     except Exception as e:
         return jsonify({'message': f'An error occurred: {str(e)}'}), 500
-    finally:
-        conn.close()
 
 @app.route('/api/exams/settings', methods=['POST'])
 def save_exam_settings():
-    data = request.json
-    teacher_id = data.get('teacher_id')
-    exam_id = data.get('exam_id')
-    exam_title = data.get('exam_title')
-    school_name = data.get('school_name')
-    duration = data.get('duration')
-    attempts = data.get('attempts')
-    passing_percentage = data.get('passing_percentage')
-    enable_analysis_report = data.get('enable_analysis_report', False)
-    
-    if not all([teacher_id, exam_id, exam_title, school_name, duration, attempts, passing_percentage is not None]):
-        return jsonify({'message': 'All fields are required.'}), 400
+    req = decode_body(ExamSettingsRequest)
+    teacher_id = req.teacher_id
+    exam_id = req.exam_id
+    exam_title = req.exam_title
+    school_name = req.school_name
+    duration = req.duration
+    attempts = req.attempts
+    passing_percentage = req.passing_percentage
+    enable_analysis_report = req.enable_analysis_report
 
     conn = get_db_connection()
     c = conn.cursor()
     
     try:
-        c.execute('SELECT 1 FROM questions WHERE exam_id = ? AND teacher_id = ? AND question_text = "placeholder"', (exam_id, teacher_id))
-        if c.fetchone():
-            c.execute('''
-                UPDATE questions SET exam_title = ?, school_name = ?, duration = ?, allowed_attempts = ?, passing_percentage = ?, enable_analysis_report = ?
-                WHERE exam_id = ? AND teacher_id = ? AND question_text = "placeholder"
-            ''', (exam_title, school_name, duration, attempts, passing_percentage, 1 if enable_analysis_report else 0, exam_id, teacher_id))
-        else:
-            c.execute('''
-                INSERT INTO questions (exam_id, teacher_id, exam_title, school_name, duration, allowed_attempts, passing_percentage, enable_analysis_report, question_text, correct_option, options)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'placeholder', 'A', '{}')
-            ''', (exam_id, teacher_id, exam_title, school_name, duration, attempts, passing_percentage, 1 if enable_analysis_report else 0))
-            
+        # Only the owning teacher may overwrite an existing exam's settings
+        c.execute('''
+            INSERT INTO exams (exam_id, teacher_id, exam_title, school_name, duration, allowed_attempts, passing_percentage, enable_analysis_report)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (exam_id) DO UPDATE SET
+                exam_title = excluded.exam_title, school_name = excluded.school_name, duration = excluded.duration,
+                allowed_attempts = excluded.allowed_attempts, passing_percentage = excluded.passing_percentage,
+                enable_analysis_report = excluded.enable_analysis_report
+            WHERE exams.teacher_id = excluded.teacher_id
+        ''', (exam_id, teacher_id, exam_title, school_name, duration, attempts, passing_percentage, 1 if enable_analysis_report else 0))
         conn.commit()
+        if c.rowcount == 0:
+            return jsonify({'message': 'Exam ID is already used by another teacher.'}), 409
         return jsonify({'message': 'Exam settings saved successfully.'}), 200
+    except sqlite3.IntegrityError:
+        # The only constraint left to fail is the teachers foreign key
+        return jsonify({'message': 'Teacher not found.'}), 404
     except Exception as e:
         return jsonify({'message': f'An error occurred: {str(e)}'}), 500
-    finally:
-        conn.close()
 
 @app.route('/api/exam/start', methods=['POST'])
 def check_exam_eligibility():
-    data = request.json
-    student_id = data.get('student_id')
-    exam_id = data.get('exam_id')
+    req = decode_body(StartExamRequest)
+    student_id = req.student_id
+    exam_id = req.exam_id
 
     conn = get_db_connection()
-    try:
-        c = conn.cursor()
-        c.execute('SELECT teacher_id FROM questions WHERE exam_id = ? LIMIT 1', (exam_id,))
-        exam_teacher = c.fetchone()
-        if not exam_teacher:
-            return jsonify({'message': 'Exam not found.'}), 404
-        
-        c.execute('SELECT 1 FROM students WHERE student_id = ? AND teacher_id = ?', (student_id, exam_teacher['teacher_id']))
-        if not c.fetchone():
-            return jsonify({'message': 'Student ID not found or not associated with this exam.'}), 404
-
-        c.execute('''
-            SELECT exam_title, school_name, duration, allowed_attempts, passing_percentage, enable_analysis_report
-            FROM questions WHERE exam_id = ? LIMIT 1
-        ''', (exam_id,))
-        exam_settings = c.fetchone()
-
-        if not exam_settings:
-            return jsonify({'message': 'Could not retrieve exam settings.'}), 404
-
-        allowed_attempts = exam_settings['allowed_attempts']
-        c.execute('SELECT COUNT(*) as num_attempts FROM results WHERE student_id = ? AND exam_id = ?', (student_id, exam_id))
-        attempts_taken = c.fetchone()['num_attempts']
-        
-        if attempts_taken >= allowed_attempts:
-            return jsonify({'message': f'You have already taken this exam {attempts_taken} times. No more attempts remaining.'}), 403
+    c = conn.cursor()
+    c.execute(SQL_GET_EXAM_SETTINGS, (exam_id,))
+    exam_settings = c.fetchone()
+    if not exam_settings:
+        return jsonify({'message': 'Exam not found.'}), 404
+    
+    # student_id is the primary key, so one lookup covers both the ownership check and the profile
+    c.execute(SQL_GET_STUDENT, (student_id,))
+    student_data = c.fetchone()
+    if not student_data or student_data['teacher_id'] != exam_settings['teacher_id']:
+        return jsonify({'message': 'Student ID not found or not associated with this exam.'}), 404
+
+    allowed_attempts = exam_settings['allowed_attempts']
+    c.execute(SQL_COUNT_ATTEMPTS, (student_id, exam_id))
+    attempts_taken = c.fetchone()['num_attempts']
+    
+    if attempts_taken >= allowed_attempts:
+        return jsonify({'message': f'You have already taken this exam {attempts_taken} times. No more attempts remaining.'}), 403
 
-        c.execute('SELECT student_name, teacher_id FROM students WHERE student_id = ?', (student_id,))
-        student_data = c.fetchone()
-        
-        c.execute('SELECT question_text, options, image_url FROM questions WHERE exam_id = ? AND question_text != "placeholder"', (exam_id,))
-        exam_data_rows = c.fetchall()
+    c.execute(SQL_GET_EXAM_QUESTIONS, (exam_id,))
+    exam_data_rows = c.fetchall()
 
-        if not exam_data_rows:
-            return jsonify({'message': 'This exam has no questions. Please contact your teacher.'}), 404
-        
-        questions_list = []
-        for q in exam_data_rows:
-            questions_list.append({
-                'question_text': q['question_text'],
-                'options': json.loads(q['options']),
-                'image_url': q['image_url']
-            })
+    if not exam_data_rows:
+        return jsonify({'message': 'This exam has no questions. Please contact your teacher.'}), 404
+    
+    # JSON columns are embedded as stored (orjson.Fragment) rather than decoded and re-encoded
+    questions_list = []
+    for q in exam_data_rows:
+        questions_list.append({
+            'question_text': q['question_text'],
+            'options': orjson.Fragment(q['options']),
+            'image_url': q['image_url']
+        })
 
-        import random
-        random.shuffle(questions_list)
-        
-        c.execute('SELECT answers, time_left, question_status FROM in_progress_exams WHERE student_id = ? AND exam_id = ?', (student_id, exam_id))
-        in_progress_data = c.fetchone()
-
-        exam_data = {
-            'exam_title': exam_settings['exam_title'],
-            'school_name': exam_settings['school_name'],
-            'duration': exam_settings['duration'],
-            'allowed_attempts': exam_settings['allowed_attempts'],
-            'passing_percentage': exam_settings['passing_percentage'],
-            'enable_analysis_report': bool(exam_settings['enable_analysis_report']),
-            'questions': questions_list,
-            'answers': json.loads(in_progress_data['answers']) if in_progress_data else {},
-            'question_status': json.loads(in_progress_data['question_status']) if in_progress_data else {},
-            'time_left': in_progress_data['time_left'] if in_progress_data else exam_settings['duration'] * 60,
-            'attempt_number': attempts_taken + 1
-        }
-        
-        return jsonify({
-            'message': 'Eligibility check passed.',
-            'student_name': student_data['student_name'],
-            'teacher_id': student_data['teacher_id'],
-            'exam_data': exam_data
-        }), 200
-        
-    finally:
-        conn.close()
+    random.shuffle(questions_list)
+    
+    c.execute(SQL_GET_IN_PROGRESS, (student_id, exam_id))
+    in_progress_data = c.fetchone()
+
+    exam_data = {
+        'exam_title': exam_settings['exam_title'],
+        'school_name': exam_settings['school_name'],
+        'duration': exam_settings['duration'],
+        'allowed_attempts': exam_settings['allowed_attempts'],
+        'passing_percentage': exam_settings['passing_percentage'],
+        'enable_analysis_report': bool(exam_settings['enable_analysis_report']),
+        'questions': questions_list,
+        'answers': orjson.Fragment(in_progress_data['answers']) if in_progress_data else {},
+        'question_status': orjson.Fragment(in_progress_data['question_status']) if in_progress_data else {},
+        'time_left': in_progress_data['time_left'] if in_progress_data else exam_settings['duration'] * 60,
+        'attempt_number': attempts_taken + 1
+    }
+    
+    return jsonify({
+        'message': 'Eligibility check passed.',
+        'student_name': student_data['student_name'],
+        'teacher_id': student_data['teacher_id'],
+        'exam_data': exam_data
+    }), 200
 
 @app.route('/api/save-progress', methods=['POST'])
 def save_progress():
-    data = request.json
-    student_id = data.get('student_id')
-    exam_id = data.get('exam_id')
-    teacher_id = data.get('teacher_id')
-    answers = data.get('answers')
-    time_left = data.get('time_left')
-    question_status = data.get('question_status')
-
-    if not all([student_id, exam_id, teacher_id, answers, time_left is not None, question_status]):
-        return jsonify({'message': 'Invalid data'}), 400
+    req = decode_body(SaveProgressRequest)
+    student_id = req.student_id
+    exam_id = req.exam_id
+    teacher_id = req.teacher_id
+    answers = req.answers
+    time_left = req.time_left
+    question_status = req.question_status
 
     conn = get_db_connection()
     c = conn.cursor()
     try:
-        c.execute('''
-            INSERT OR REPLACE INTO in_progress_exams (student_id, exam_id, teacher_id, answers, time_left, question_status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (student_id, exam_id, teacher_id, json.dumps(answers), time_left, json.dumps(question_status)))
+        c.execute(SQL_SAVE_PROGRESS, (student_id, exam_id, teacher_id, orjson.dumps(answers).decode(), time_left, orjson.dumps(question_status).decode()))
         conn.commit()
         return jsonify({'message': 'Progress saved successfully.'}), 200
+    except sqlite3.IntegrityError:
+        # The only constraint left to fail is the exams foreign key
+        return jsonify({'message': 'Exam not found.'}), 404
     except Exception as e:
         return jsonify({'message': f'An error occurred: {str(e)}'}), 500
-    finally:
-        conn.close()
 
 @app.route('/api/questions/by-exam/<exam_id>', methods=['GET'])
 def get_questions_by_exam(exam_id):
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('SELECT question_text, correct_option, options, image_url FROM questions WHERE exam_id = ? AND question_text != "placeholder"', (exam_id,))
+    etag, not_modified = _version_etag(c, SQL_GET_QUESTIONS_VERSION, exam_id)
+    if not_modified:
+        return not_modified
+
+    c.execute('SELECT question_text, correct_option, options, image_url FROM questions WHERE exam_id = ?', (exam_id,))
     questions = c.fetchall()
-    conn.close()
     
     questions_list = []
     for q in questions:
         questions_list.append({
             'question_text': q['question_text'],
             'correct_option': q['correct_option'],
-            'options': json.loads(q['options']),
+            'options': orjson.Fragment(q['options']),
             'image_url': q['image_url']
         })
     
-    return jsonify(questions_list), 200
+    return _with_etag(jsonify(questions_list), etag), 200
 
 @app.route('/api/exams/by-teacher/<teacher_id>', methods=['GET'])
 def get_exams_by_teacher(teacher_id):
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('SELECT DISTINCT exam_id, exam_title FROM questions WHERE teacher_id = ?', (teacher_id,))
+    c.execute('SELECT exam_id, exam_title FROM exams WHERE teacher_id = ?', (teacher_id,))
     exams = c.fetchall()
-    conn.close()
     return jsonify([dict(row) for row in exams]), 200
 
 @app.route('/api/submit/exam', methods=['POST'])
 def submit_exam():
-    data = request.json
-    exam_id = data.get('exam_id')
-    student_id = data.get('student_id')
-    student_name = data.get('student_name')
-    answers = data.get('answers')
-    teacher_id = data.get('teacher_id')
+    req = decode_body(SubmitExamRequest)
+    exam_id = req.exam_id
+    student_id = req.student_id
+    student_name = req.student_name
+    answers = req.answers
+    teacher_id = req.teacher_id
     
     conn = get_db_connection()
     c = conn.cursor()
     
     try:
-        all_questions = c.execute('SELECT question_text, correct_option, options FROM questions WHERE exam_id = ? AND question_text != "placeholder"', (exam_id,)).fetchall()
-        if not all_questions:
+        version = c.execute(SQL_GET_QUESTIONS_VERSION, (exam_id,)).fetchone()
+        answer_key = _exam_answer_key(exam_id, version['questions_version']) if version else ()
+        if not answer_key:
             return jsonify({'message': 'Could not find questions for this exam to calculate score.'}), 500
 
-        correct_answers_map = {row['question_text']: row['correct_option'] for row in all_questions}
         score = 0
         analysis_report = []
-
-        for question in all_questions:
-            q_text = question['question_text']
-            student_answer_key = answers.get(q_text)
-            correct_answer_key = correct_answers_map.get(q_text)
-            is_correct = (student_answer_key == correct_answer_key)
+        for question_text, correct_option, options in answer_key:
+            student_answer = answers.get(question_text)
+            is_correct = student_answer == correct_option
             if is_correct: score += 1
-            
+
             analysis_report.append({
-                'question_text': q_text, 'options': json.loads(question['options']),
-                'student_answer': student_answer_key, 'correct_answer': correct_answer_key,
+                'question_text': question_text, 'options': orjson.Fragment(options),
+                'student_answer': student_answer, 'correct_answer': correct_option,
                 'is_correct': is_correct
             })
-            
-        result_id = str(uuid.uuid4())
+
+        result_id = uuid.uuid4().hex
         c.execute('INSERT INTO results (result_id, exam_id, student_id, student_name, teacher_id, score, answers) VALUES (?, ?, ?, ?, ?, ?, ?)',
-                  (result_id, exam_id, student_id, student_name, teacher_id, score, json.dumps(answers)))
+                  (result_id, exam_id, student_id, student_name, teacher_id, score, orjson.dumps(answers).decode()))
         
         c.execute('DELETE FROM in_progress_exams WHERE student_id = ? AND exam_id = ?', (student_id, exam_id))
         conn.commit()
@@ -568,47 +924,74 @@ def submit_exam():
         }), 200
     except Exception as e:
         return jsonify({'message': f'An error occurred during submission: {str(e)}'}), 500
-    finally:
-        conn.close()
 
 @app.route('/api/results', methods=['GET'])
 def get_all_results():
+    # Optional keyset paging: ?limit=N&after=<last result_id of the previous page>
+    limit = _page_limit()
+    if limit is None:
+        return jsonify({'message': 'limit must be a positive integer.'}), 400
+    after = request.args.get('after')
+
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('SELECT * FROM results')
-    results = c.fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in results]), 200
+    after_rowid = 0
+    if after is not None:
+        cursor_row = c.execute('SELECT rowid FROM results WHERE result_id = ?', (after,)).fetchone()
+        if cursor_row is None:
+            return jsonify({'message': 'Unknown paging cursor.'}), 400
+        after_rowid = cursor_row[0]
+    c.execute('''
+        SELECT result_id, exam_id, student_id, teacher_id, student_name, score, answers, submission_time
+        FROM results
+        WHERE rowid > ?
+        ORDER BY rowid LIMIT ?
+    ''', (after_rowid, limit))
+    return _stream_json_rows(c), 200
 
 @app.route('/api/all-questions', methods=['GET'])
 def get_all_questions():
+    # Optional keyset paging: ?limit=N&after_exam_id=...&after_question_text=... (the last row of the previous page)
+    limit = _page_limit()
+    if limit is None:
+        return jsonify({'message': 'limit must be a positive integer.'}), 400
+    after_exam_id = request.args.get('after_exam_id')
+    after_question_text = request.args.get('after_question_text')
+
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('SELECT * FROM questions')
-    questions = c.fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in questions]), 200
+    after_rowid = 0
+    if after_exam_id is not None or after_question_text is not None:
+        cursor_row = c.execute('SELECT rowid FROM questions WHERE exam_id = ? AND question_text = ?',
+                               (after_exam_id, after_question_text)).fetchone()
+        if cursor_row is None:
+            return jsonify({'message': 'Unknown paging cursor.'}), 400
+        after_rowid = cursor_row[0]
+    c.execute('''
+        SELECT q.exam_id, q.teacher_id, q.question_text, q.correct_option, q.options, q.image_url,
+               e.exam_title, e.school_name, e.duration, e.allowed_attempts, e.passing_percentage, e.enable_analysis_report
+        FROM questions q JOIN exams e ON e.exam_id = q.exam_id
+        WHERE q.rowid > ?
+        ORDER BY q.rowid LIMIT ?
+    ''', (after_rowid, limit))
+    return _stream_json_rows(c), 200
 
 @app.route('/api/question/delete', methods=['DELETE'])
 def delete_question():
-    data = request.json
-    teacher_id = data.get('teacher_id')
-    exam_id = data.get('exam_id')
-    question_text = data.get('question_text')
-    if not all([teacher_id, exam_id, question_text]):
-        return jsonify({'message': 'Invalid data provided.'}), 400
+    req = decode_body(DeleteQuestionRequest)
+    teacher_id = req.teacher_id
+    exam_id = req.exam_id
+    question_text = req.question_text
     conn = get_db_connection()
     c = conn.cursor()
-    try:
-        c.execute('DELETE FROM questions WHERE teacher_id = ? AND exam_id = ? AND question_text = ?',
-                  (teacher_id, exam_id, question_text))
+    c.execute('DELETE FROM questions WHERE teacher_id = ? AND exam_id = ? AND question_text = ?',
+              (teacher_id, exam_id, question_text))
+    if c.rowcount > 0:
+        _bump_questions_version(c, exam_id)
         conn.commit()
-        if c.rowcount > 0:
-            return jsonify({'message': 'Question deleted successfully.'}), 200
-        else:
-            return jsonify({'message': 'Question not found or you are not authorized to delete.'}), 404
-    finally:
-        conn.close()
+        return jsonify({'message': 'Question deleted successfully.'}), 200
+    else:
+        return jsonify({'message': 'Question not found or you are not authorized to delete.'}), 404
 
 # --- FORCE DB INIT ON STARTUP ---
 init_db()
@@ -616,5 +999,7 @@ init_db()
 if __name__ == '__main__':
     if not os.path.exists(STATIC_DIR):
         os.makedirs(STATIC_DIR)
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
+    debug = os.environ.get('FLASK_ENV') == 'development'
     print(f"Server running at http://0.0.0.0:5000")
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=debug, threaded=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,14 @@
+import multiprocessing
+import os
+
+# Gunicorn settings for production (see the Dockerfile start command)
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+
+# Threaded workers: each thread checks out its own pooled SQLite connection,
+# and WAL lets their reads run alongside a commit.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# Give every worker thread a connection unless the pool size is set explicitly
+os.environ.setdefault('DB_POOL_SIZE', str(threads))